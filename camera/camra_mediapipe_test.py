@@ -7,6 +7,9 @@ Pi Camera + MediaPipe with real-time-correct recording.
 - Else: warm up to estimate actual FPS and open OpenCV VideoWriter with that FPS
   (closer to real-time than a hard-coded 30 fps).
 
+Capture, MediaPipe inference and encoding run as a three-stage pipeline
+(capture thread -> inference thread -> main thread) joined by bounded queues.
+
 Also includes resilient preview:
   * Tries Picamera2 Qt preview + overlay (best), else falls back to OpenCV window.
 
@@ -17,18 +20,27 @@ Stop keys:
 
 from pathlib import Path
 from datetime import datetime
-import os, time, cv2, numpy as np, shutil, subprocess, sys
+import os, time, cv2, numpy as np, shutil, subprocess, sys, threading, queue, fcntl, signal
+import collections, multiprocessing
+from multiprocessing import shared_memory
+from types import SimpleNamespace
 
 # ---------- USER SETTINGS ----------
 video_name       = "demo_session"     # folder to store recordings
 resolution       = (1280, 720)        # (width, height)
+infer_scale      = 0.5                # MediaPipe input scale vs. resolution (1.0 = full frame)
 camera_fps_req   = 30                 # requested sensor/output fps
-flip_horizontal  = True
+flip_horizontal  = True               # mirrored by the camera ISP (libcamera Transform), no CPU cost
+use_opencl       = True               # run the inference resize through OpenCL (cv2.UMat) when available
 mediapipe_mode   = "pose"         # "holistic" | "pose" | "hands" | "face"
+mediapipe_worker = True               # run MediaPipe in its own process (parallel with drawing/encoding)
 show_preview     = True               # live preview on screen
 warmup_seconds   = 2.0                # only used if ffmpeg is NOT available
 ffmpeg_crf       = 23                 # lower = better quality, bigger file
 ffmpeg_preset    = "veryfast"         # ultrafast | superfast | veryfast | faster | fast | medium | ...
+ffmpeg_hw_encode = True               # use the Pi's hardware H.264 encoder (h264_v4l2m2m) when present
+ffmpeg_hw_bitrate = "4M"              # bitrate for the hardware encoder (it has no CRF mode)
+ffmpeg_pipe_size = 1 << 20            # kernel pipe buffer to ffmpeg (Linux default is 64 KiB)
 # -----------------------------------
 
 # Make Qt happy on Wayland/Bookworm if present (harmless otherwise)
@@ -40,6 +52,7 @@ if "XDG_RUNTIME_DIR" not in os.environ:
     os.environ["XDG_RUNTIME_DIR"] = rd
 
 from picamera2 import Picamera2
+from libcamera import Transform
 # Choose best Picamera2 preview class present
 try:
     from picamera2.previews import QtGlPreview as PiPreview
@@ -57,82 +70,268 @@ mp_draw   = mp.solutions.drawing_utils
 mp_styles = mp.solutions.drawing_styles
 
 
-def open_mediapipe(mode: str):
+class LandmarkPainter:
+    """
+    Vectorized replacement for mp_draw.draw_landmarks on one connection set.
+    Connections are grouped by drawing spec once, as (N, 2) landmark-index arrays; per frame each
+    group is a single cv2.polylines call over all its segments instead of one cv2.line per connection.
+    Styles may be a DrawingSpec, a dict (per connection / per landmark), or None (don't draw).
+    Landmarks with visibility < 0.5 or outside the image are skipped, as in draw_landmarks.
+    """
+
+    def __init__(self, connections, connection_style=None, landmark_style=None):
+        if connection_style is None:
+            connection_style = mp_draw.DrawingSpec()
+        groups = {}
+        for a, b in connections:
+            spec = connection_style[(a, b)] if isinstance(connection_style, dict) else connection_style
+            groups.setdefault((tuple(spec.color), spec.thickness), []).append((a, b))
+        self._groups = [(np.array(conns, dtype=np.int32), color, thickness)
+                        for (color, thickness), conns in groups.items()]
+        self._landmark_style = landmark_style
+
+    def __call__(self, img, landmark_list):
+        lms = landmark_list.landmark
+        n = len(lms)
+        if n == 0:
+            return
+        h, w = img.shape[:2]
+        xy = np.fromiter((v for lm in lms for v in (lm.x, lm.y)), np.float32, 2 * n).reshape(n, 2)
+        ok = ((xy >= 0.0) & (xy <= 1.0)).all(axis=1)
+        if lms[0].HasField("visibility"):
+            ok &= np.fromiter((lm.visibility for lm in lms), np.float32, n) >= 0.5
+        pts = np.minimum(xy * (w, h), (w - 1, h - 1)).astype(np.int32)
+
+        for idx, color, thickness in self._groups:
+            idx = idx[ok[idx].all(axis=1)]
+            if len(idx):
+                cv2.polylines(img, pts[idx], False, color, thickness)   # (N, 2, 2): one segment each
+
+        style = self._landmark_style
+        if style is None:
+            return
+        for i in np.flatnonzero(ok):
+            spec = style[int(i)] if isinstance(style, dict) else style
+            cv2.circle(img, (int(pts[i, 0]), int(pts[i, 1])), spec.circle_radius, spec.color, spec.thickness)
+
+
+def open_mediapipe(mode: str, create_solution=True):
+    # With create_solution=False only draw() is built (sol is None), for when inference
+    # runs in a MediaPipeWorker process.
+    # Drawing styles and connection tables are built once here into LandmarkPainters
+    # that draw() closes over.
     mode = (mode or "holistic").lower()
+    default_landmarks = mp_draw.DrawingSpec(color=mp_draw.RED_COLOR)
     if mode == "pose":
         mp_pose = mp.solutions.pose
-        sol = mp_pose.Pose(model_complexity=0, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        sol = mp_pose.Pose(model_complexity=0, min_detection_confidence=0.5,
+                           min_tracking_confidence=0.5) if create_solution else None
+        paint_pose = LandmarkPainter(mp_pose.POSE_CONNECTIONS,
+                                     landmark_style=mp_styles.get_default_pose_landmarks_style())
         def draw(img, r):
             if r.pose_landmarks:
-                mp_draw.draw_landmarks(img, r.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                       landmark_drawing_spec=mp_styles.get_default_pose_landmarks_style())
+                paint_pose(img, r.pose_landmarks)
         return sol, draw
     if mode == "hands":
         mp_hands = mp.solutions.hands
         sol = mp_hands.Hands(model_complexity=0, max_num_hands=2,
-                             min_detection_confidence=0.5, min_tracking_confidence=0.5)
+                             min_detection_confidence=0.5,
+                             min_tracking_confidence=0.5) if create_solution else None
+        paint_hand = LandmarkPainter(mp_hands.HAND_CONNECTIONS, landmark_style=default_landmarks)
         def draw(img, r):
             if r.multi_hand_landmarks:
                 for h in r.multi_hand_landmarks:
-                    mp_draw.draw_landmarks(img, h, mp_hands.HAND_CONNECTIONS)
+                    paint_hand(img, h)
         return sol, draw
     if mode == "face":
         mp_face = mp.solutions.face_mesh
         sol = mp_face.FaceMesh(static_image_mode=False, refine_landmarks=False, max_num_faces=1,
-                               min_detection_confidence=0.5, min_tracking_confidence=0.5)
+                               min_detection_confidence=0.5,
+                               min_tracking_confidence=0.5) if create_solution else None
+        paint_tess = LandmarkPainter(mp_face.FACEMESH_TESSELATION,
+                                     mp_styles.get_default_face_mesh_tesselation_style())
+        paint_contours = LandmarkPainter(mp_face.FACEMESH_CONTOURS,
+                                         mp_styles.get_default_face_mesh_contours_style())
         def draw(img, r):
             if r.multi_face_landmarks:
                 for f in r.multi_face_landmarks:
-                    mp_draw.draw_landmarks(img, f, mp_face.FACEMESH_TESSELATION, None,
-                                           mp_styles.get_default_face_mesh_tesselation_style())
-                    mp_draw.draw_landmarks(img, f, mp_face.FACEMESH_CONTOURS, None,
-                                           mp_styles.get_default_face_mesh_contours_style())
+                    paint_tess(img, f)
+                    paint_contours(img, f)
         return sol, draw
 
     # default: holistic
     mp_hol = mp.solutions.holistic
     sol = mp_hol.Holistic(model_complexity=0, refine_face_landmarks=False,
-                          min_detection_confidence=0.5, min_tracking_confidence=0.5)
+                          min_detection_confidence=0.5,
+                          min_tracking_confidence=0.5) if create_solution else None
+    paint_tess = LandmarkPainter(mp_hol.FACEMESH_TESSELATION,
+                                 mp_styles.get_default_face_mesh_tesselation_style())
+    paint_contours = LandmarkPainter(mp_hol.FACEMESH_CONTOURS,
+                                     mp_styles.get_default_face_mesh_contours_style())
+    paint_pose = LandmarkPainter(mp_hol.POSE_CONNECTIONS,
+                                 landmark_style=mp_styles.get_default_pose_landmarks_style())
+    paint_hand = LandmarkPainter(mp_hol.HAND_CONNECTIONS, landmark_style=default_landmarks)
     def draw(img, r):
         if r.face_landmarks:
-            mp_draw.draw_landmarks(img, r.face_landmarks, mp_hol.FACEMESH_TESSELATION, None,
-                                   mp_styles.get_default_face_mesh_tesselation_style())
-            mp_draw.draw_landmarks(img, r.face_landmarks, mp_hol.FACEMESH_CONTOURS, None,
-                                   mp_styles.get_default_face_mesh_contours_style())
+            paint_tess(img, r.face_landmarks)
+            paint_contours(img, r.face_landmarks)
         if r.pose_landmarks:
-            mp_draw.draw_landmarks(img, r.pose_landmarks, mp_hol.POSE_CONNECTIONS,
-                                   landmark_drawing_spec=mp_styles.get_default_pose_landmarks_style())
+            paint_pose(img, r.pose_landmarks)
         if r.left_hand_landmarks:
-            mp_draw.draw_landmarks(img, r.left_hand_landmarks, mp_hol.HAND_CONNECTIONS)
+            paint_hand(img, r.left_hand_landmarks)
         if r.right_hand_landmarks:
-            mp_draw.draw_landmarks(img, r.right_hand_landmarks, mp_hol.HAND_CONNECTIONS)
+            paint_hand(img, r.right_hand_landmarks)
     return sol, draw
 
 
-def start_ffmpeg_writer(path: Path, size, crf=23, preset="veryfast"):
+class InlineMediaPipe:
+    """MediaPipe in this process, behind the same process/submit/collect interface as MediaPipeWorker."""
+
+    def __init__(self, mode):
+        self._sol, _ = open_mediapipe(mode)
+        self._results = collections.deque()
+
+    def process(self, frame):
+        return self._sol.process(frame)
+
+    def submit(self, frame):
+        self._results.append(self._sol.process(frame))
+
+    def collect(self):
+        return self._results.popleft()
+
+    def close(self):
+        self._sol.close()
+
+
+def _mediapipe_worker_main(mode, shm_names, shape, in_q, out_q):
+    # Ctrl+C reaches the whole process group; the worker must outlive it until the parent has
+    # drained the pipeline and sends the None sentinel from close().
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sol, _ = open_mediapipe(mode)
+    shms = [shared_memory.SharedMemory(name=n) for n in shm_names]
+    frames = [np.ndarray(shape, np.uint8, buffer=m.buf) for m in shms]
+    try:
+        while True:
+            item = in_q.get()
+            if item is None:
+                break
+            slot, seq = item
+            r = sol.process(frames[slot])
+            # SolutionOutputs is a dynamically created namedtuple and doesn't pickle;
+            # ship just the landmark protobufs that draw() reads.
+            out_q.put((seq, {k: getattr(r, k) for k in r._fields if k.endswith("landmarks")}))
+    finally:
+        sol.close()
+        del frames
+        for m in shms:
+            m.close()
+
+
+class MediaPipeWorker:
+    """
+    MediaPipe in a separate process, so inference is not serialized with this process's
+    Python-side drawing and encoding by the GIL.
+    Frames go through two shared-memory slots (double buffering, at most two frames in flight);
+    only (slot, seq) crosses the queue. Results come back as a namespace of landmark protobufs.
     """
-    Start an ffmpeg process that accepts raw BGR frames on stdin and writes MP4 with wall-clock timestamps.
+
+    def __init__(self, mode, size):
+        w, h = size
+        self._shape = (h, w, 3)
+        nbytes = w * h * 3
+        self._shms = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(2)]
+        self._frames = [np.ndarray(self._shape, np.uint8, buffer=m.buf) for m in self._shms]
+        ctx = multiprocessing.get_context("spawn")  # don't fork a process that has camera/Qt threads
+        self._in_q = ctx.Queue()
+        self._out_q = ctx.Queue()
+        self._proc = ctx.Process(target=_mediapipe_worker_main, name="mediapipe",
+                                 args=(mode, [m.name for m in self._shms], self._shape, self._in_q, self._out_q),
+                                 daemon=True)
+        self._proc.start()
+        self._seq = 0
+
+    def submit(self, frame):
+        slot = self._seq % 2
+        np.copyto(self._frames[slot], frame)
+        self._in_q.put((slot, self._seq))
+        self._seq += 1
+
+    def collect(self):
+        while True:
+            try:
+                _, fields = self._out_q.get(timeout=1.0)
+                return SimpleNamespace(**fields)
+            except queue.Empty:
+                if not self._proc.is_alive():
+                    raise RuntimeError("MediaPipe worker process exited unexpectedly")
+
+    def process(self, frame):
+        self.submit(frame)
+        return self.collect()
+
+    def close(self):
+        self._in_q.put(None)
+        self._proc.join(timeout=5.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        del self._frames
+        for m in self._shms:
+            m.close()
+            m.unlink()
+
+
+def pi_hw_encoder_available():
+    """True on a Raspberry Pi that exposes the V4L2 M2M H.264 encoder (Pi 4 and earlier; the Pi 5 has none)."""
+    try:
+        model = Path("/proc/device-tree/model").read_text(errors="ignore")
+    except OSError:
+        return False
+    return "Raspberry Pi" in model and Path("/dev/video11").exists()
+
+
+def start_ffmpeg_writer(path: Path, size, crf=23, preset="veryfast", pix_fmt="rgb24",
+                        hw_encode=False, bitrate="4M", pipe_size=1 << 20):
+    """
+    Start an ffmpeg process that accepts raw frames on stdin and writes MP4 with wall-clock timestamps.
+    `pix_fmt` describes the layout of the frames we pipe in (the camera's RGB888 buffer by default),
+    so no per-frame colour conversion is needed on our side; ffmpeg converts once, to yuv420p.
+    With hw_encode=True the Pi's h264_v4l2m2m encoder is used instead of libx264, leaving the CPU
+    to MediaPipe.
     Requires: sudo apt install -y ffmpeg
     """
     w, h = size
+    if hw_encode:
+        codec = ["-c:v", "h264_v4l2m2m", "-b:v", str(bitrate)]
+    else:
+        # Real-time pipe: sliced threads, no lookahead/B-frames -> bounded per-frame encode time
+        # and no multi-frame buffering inside x264. Leave one core for MediaPipe.
+        codec = ["-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+                 "-tune", "zerolatency",
+                 "-threads", str(max(1, (os.cpu_count() or 2) - 1)),
+                 "-x264-params", "sliced-threads=1:sync-lookahead=0:rc-lookahead=0:bframes=0"]
     cmd = [
         "ffmpeg",
         "-hide_banner",
         "-loglevel", "error",
         "-f", "rawvideo",
-        "-pix_fmt", "bgr24",
+        "-pix_fmt", pix_fmt,
         "-video_size", f"{w}x{h}",
         "-use_wallclock_as_timestamps", "1",  # derive PTS from wall clock (VFR)
         "-i", "-",                            # read raw frames from stdin
         "-an",
-        "-c:v", "libx264",
-        "-preset", preset,
-        "-crf", str(crf),
-        "-vf", "format=yuv420p",              # playback compatibility
+        *codec,
+        "-pix_fmt", "yuv420p",                # playback compatibility
         "-movflags", "+faststart",
         str(path)
     ]
     proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    # A 1280x720 frame is ~2.7 MB; with the default 64 KiB pipe every frame write is chopped into
+    # dozens of wake-ups of ffmpeg. Grow the pipe (capped by /proc/sys/fs/pipe-max-size).
+    try:
+        fcntl.fcntl(proc.stdin.fileno(), getattr(fcntl, "F_SETPIPE_SZ", 1031), pipe_size)
+    except OSError as e:
+        print("[WARN] Could not enlarge ffmpeg pipe:", e)
     return proc
 
 
@@ -160,6 +359,7 @@ def main():
     picam2 = Picamera2()
     cfg = picam2.create_video_configuration(
         main={"size": resolution, "format": "RGB888"},
+        transform=Transform(hflip=1 if flip_horizontal else 0),
         controls={"FrameRate": camera_fps_req}
     )
     picam2.configure(cfg)
@@ -177,13 +377,76 @@ def main():
             except RuntimeError as e:
                 print("[WARN] Qt preview not usable:", e)
                 print("[INFO] Falling back to OpenCV window (press 'q' to quit).")
-                cv2.namedWindow("Preview", cv2.WINDOW_NORMAL)
         else:
             print("[INFO] Qt preview not available; using OpenCV window.")
-            cv2.namedWindow("Preview", cv2.WINDOW_NORMAL)
 
-    # --- mediapipe ---
-    solution, draw = open_mediapipe(mediapipe_mode)
+    # --- reusable output buffers (landmarks are drawn in place on the camera frame) ---
+    w, h = resolution
+    bgr_buf = np.empty((h, w, 3), np.uint8)
+    bgra_buf = None
+    if use_overlay:
+        # Overlay alpha is constant: fill it once, then only the colour channels are rewritten per frame.
+        bgra_buf = np.empty((h, w, 4), np.uint8)
+        bgra_buf[..., 3] = 230
+
+    # MediaPipe landmarks are normalized (0-1), so inference can run on a downscaled
+    # copy while drawing still lands correctly on the full-resolution frame.
+    infer_size = (max(1, int(w * infer_scale)), max(1, int(h * infer_scale)))
+
+    # With OpenCL, the resize runs on the GPU via UMat; the result comes back with .get()
+    # because MediaPipe needs a NumPy array.
+    ocl = use_opencl and cv2.ocl.haveOpenCL()
+    cv2.ocl.setUseOpenCL(ocl)
+    print(f"[INFO] OpenCL for resize: {'on' if ocl else 'off'}")
+
+    def prepare(rgb):
+        """Build MediaPipe's input; returns (full_frame, infer_frame). Mirroring is done by the ISP."""
+        if infer_size == (w, h):
+            return rgb, rgb
+        src = cv2.UMat(rgb) if ocl else rgb
+        small = cv2.resize(src, infer_size, interpolation=cv2.INTER_AREA)
+        return rgb, (small.get() if ocl else small)
+
+    # --- mediapipe: inference in a worker process (or inline); drawing always happens here ---
+    _, draw = open_mediapipe(mediapipe_mode, create_solution=False)
+    if mediapipe_worker:
+        solution = MediaPipeWorker(mediapipe_mode, infer_size)
+    else:
+        solution = InlineMediaPipe(mediapipe_mode)
+
+    stop_event = threading.Event()
+
+    # OpenCV preview runs on its own UI thread so imshow/waitKey stay off the encode path.
+    # Every HighGUI call (window creation included) happens on that thread: with the Qt backend
+    # of the opencv-python wheels, a window is only serviced by the thread that created it.
+    # Hand-off: the main thread fills preview_buf only while preview_ready is clear, the UI
+    # thread shows it and clears the flag, so the buffer is never written while displayed.
+    # 'q' sets stop_event; the pipeline then drains and the poison pill ends the main loop.
+    use_cv_preview = show_preview and not use_overlay
+    preview_buf = np.empty((h, w, 3), np.uint8) if use_cv_preview else None
+    preview_ready = threading.Event()
+
+    def preview_loop():
+        cv2.namedWindow("Preview", cv2.WINDOW_NORMAL)
+        try:
+            while not stop_event.is_set():
+                if preview_ready.wait(timeout=0.1):
+                    cv2.imshow("Preview", preview_buf)
+                    preview_ready.clear()
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    stop_event.set()
+        finally:
+            cv2.destroyWindow("Preview")
+
+    def show_preview_frame(bgr):
+        """Hand a BGR frame to the UI thread unless it is still showing the previous one."""
+        if not preview_ready.is_set():
+            np.copyto(preview_buf, bgr)
+            preview_ready.set()
+
+    ui_thread = threading.Thread(target=preview_loop, name="preview", daemon=True)
+    if use_cv_preview:
+        ui_thread.start()
 
     # --- choose writer: ffmpeg (VFR) if available, else OpenCV with warm-up FPS ---
     have_ffmpeg = shutil.which("ffmpeg") is not None
@@ -193,30 +456,30 @@ def main():
 
     if have_ffmpeg:
         out_path = out_stub.with_suffix(".mp4")
-        print(f"[INFO] Recording (ffmpeg VFR) to: {out_path}")
-        ffmpeg_proc = start_ffmpeg_writer(out_path, resolution, crf=ffmpeg_crf, preset=ffmpeg_preset)
+        hw_encode = ffmpeg_hw_encode and pi_hw_encoder_available()
+        print(f"[INFO] Recording (ffmpeg VFR, {'h264_v4l2m2m' if hw_encode else 'libx264'}) to: {out_path}")
+        ffmpeg_proc = start_ffmpeg_writer(out_path, resolution, crf=ffmpeg_crf, preset=ffmpeg_preset,
+                                          hw_encode=hw_encode, bitrate=ffmpeg_hw_bitrate,
+                                          pipe_size=ffmpeg_pipe_size)
     else:
         print("[INFO] ffmpeg not found — will estimate FPS and use OpenCV writer.")
         # Warmup to estimate actual FPS
         warm_frames = 0
         t0 = time.time()
         while time.time() - t0 < warmup_seconds:
-            rgb = picam2.capture_array()
-            if flip_horizontal:
-                rgb = cv2.flip(rgb, 1)
-            res = solution.process(rgb)
-            annotated = rgb.copy()
-            draw(annotated, res)
-
-            bgr = cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR)
+            rgb, small = prepare(picam2.capture_array())
+            res = solution.process(small)
+            draw(rgb, res)
+
+            bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=bgr_buf)
             warm_frames += 1
 
             if use_overlay:
-                bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA); bgra[..., 3] = 230
-                picam2.set_overlay(bgra)
-            elif show_preview:
-                cv2.imshow("Preview", bgr)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                cv2.mixChannels([bgr], [bgra_buf], [0, 0, 1, 1, 2, 2])
+                picam2.set_overlay(bgra_buf)
+            elif use_cv_preview:
+                show_preview_frame(bgr)
+                if stop_event.is_set():          # 'q' in the preview window
                     break
 
         est_fps = max(5.0, min(30.0, warm_frames / max(1e-6, (time.time() - t0))))
@@ -224,46 +487,129 @@ def main():
         print(f"[INFO] Recording (OpenCV @ ~{est_fps:.1f} fps) to: {out_path}")
 
     # --- main loop ---
+    # Three stages connected by bounded queues so MediaPipe overlaps with the
+    # next capture and with the encoder:
+    #   capture thread -> cap_q -> inference thread -> enc_q -> main thread (encode + preview)
+    # The encode stage stays on the main thread so Ctrl+C keeps working.
+    cap_q = queue.Queue(maxsize=2)
+    enc_q = queue.Queue(maxsize=4)
+
+    def capture_loop():
+        try:
+            while not stop_event.is_set():
+                # Picamera2 may hand back a strided view (row padding); make it C-contiguous once
+                # here so the encode stage can pass its memory to ffmpeg without tobytes().
+                rgb = np.ascontiguousarray(picam2.capture_array())
+                ts = time.monotonic()
+                if cap_q.full():
+                    try:
+                        cap_q.get_nowait()       # drop the oldest frame, keep the freshest
+                    except queue.Empty:
+                        pass
+                cap_q.put((ts, rgb))
+        finally:
+            try:
+                cap_q.get_nowait()
+            except queue.Empty:
+                pass
+            cap_q.put(None)                      # poison pill for the inference stage
+
+    # Frame-skip governor: if a frame is already older than one camera interval when it
+    # reaches us, MediaPipe is falling behind. Reuse the previous landmarks for it instead
+    # of running inference, so every frame still reaches the encoder at camera cadence.
+    target_dt = 1.0 / camera_fps_req
+
+    # Frames wait one step in `inflight`, so frame N is handed to MediaPipe before frame N-1
+    # is drawn and queued; with the worker process, inference and drawing overlap.
+    def emit(entry, result):
+        rgb, submitted = entry
+        if submitted:
+            result = solution.collect()
+        if result is not None:
+            draw(rgb, result)                    # MediaPipe is done with rgb; annotate it in place
+        enc_q.put(rgb)
+        return result
+
+    def infer_loop():
+        result = None
+        inflight = collections.deque()           # (frame, submitted to MediaPipe?)
+        try:
+            while True:
+                item = cap_q.get()
+                if item is None:
+                    break
+                ts, rgb = item
+                rgb, small = prepare(rgb)
+                submitted = result is None or time.monotonic() - ts <= target_dt
+                if submitted:
+                    solution.submit(small)
+                inflight.append((rgb, submitted))
+                if len(inflight) > 1:
+                    result = emit(inflight.popleft(), result)
+            while inflight:
+                result = emit(inflight.popleft(), result)
+        finally:
+            stop_event.set()
+            enc_q.put(None)                      # poison pill for the encode stage
+
+    cap_thread = threading.Thread(target=capture_loop, name="capture", daemon=True)
+    infer_thread = threading.Thread(target=infer_loop, name="inference", daemon=True)
+    cap_thread.start()
+    infer_thread.start()
+
+    # FPS status is throttled by wall clock and written straight to stderr, so a slow
+    # terminal (SSH, serial console, journald) can't stall the encode loop.
+    interactive = sys.stderr.isatty()
+    log_interval = 1.0 if interactive else 5.0
+    log_end = "\r" if interactive else "\n"
+    last_log = time.monotonic()
+
     frames, t_start = 0, time.time()
     try:
         while True:
-            rgb = picam2.capture_array()
-            if flip_horizontal:
-                rgb = cv2.flip(rgb, 1)
-
-            result = solution.process(rgb)
-            annotated = rgb.copy()
-            draw(annotated, result)
-
-            bgr = cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR)
+            annotated = enc_q.get()
+            if annotated is None:
+                break
 
-            # Write frame
+            # Write frame (ffmpeg takes the annotated RGB888 frame as-is, zero-copy)
             if ffmpeg_proc is not None:
                 try:
-                    ffmpeg_proc.stdin.write(bgr.tobytes())
+                    ffmpeg_proc.stdin.write(memoryview(annotated).cast("B"))
                 except (BrokenPipeError, AttributeError):
                     print("\n[ERROR] ffmpeg pipe closed unexpectedly.")
                     break
             else:
-                writer.write(bgr)
+                writer.write(cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR, dst=bgr_buf))
 
             # Preview
             if use_overlay:
-                bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA); bgra[..., 3] = 230
-                picam2.set_overlay(bgra)
-            elif show_preview:
-                cv2.imshow("Preview", bgr)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                cv2.mixChannels([annotated], [bgra_buf], [0, 2, 1, 1, 2, 0])   # RGB -> BGR_, alpha untouched
+                picam2.set_overlay(bgra_buf)
+            elif use_cv_preview and not preview_ready.is_set():   # UI thread is done with preview_buf
+                cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR, dst=preview_buf)
+                preview_ready.set()
 
             frames += 1
-            if frames % 30 == 0:
+            now = time.monotonic()
+            if now - last_log >= log_interval:
+                last_log = now
                 dt = max(1e-6, time.time() - t_start)
-                print(f"[INFO] ~{frames/dt:.1f} FPS, {frames} frames", end="\r")
+                sys.stderr.write(f"[INFO] ~{frames/dt:.1f} FPS, {frames} frames{log_end}")
 
     except KeyboardInterrupt:
         pass
     finally:
+        # Stop the pipeline; keep draining enc_q so the inference thread never blocks on put()
+        stop_event.set()
+        while infer_thread.is_alive():
+            try:
+                enc_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        cap_thread.join(timeout=1.0)
+        if ui_thread.is_alive():
+            ui_thread.join(timeout=1.0)
+
         # Cleanup writers
         if ffmpeg_proc is not None:
             try:
@@ -281,8 +627,6 @@ def main():
                 picam2.stop_preview()
             except Exception:
                 pass
-        elif show_preview:
-            cv2.destroyAllWindows()
         picam2.stop()
 
         if out_path:
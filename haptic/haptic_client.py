@@ -7,13 +7,24 @@ Defaults are set from your ESP printout:
   MASK:  255.255.255.0  -> broadcast 192.168.86.255
   PORT:  5005
 """
-import argparse, json, socket, ipaddress, sys, time
+import argparse, json, socket, ipaddress, select, struct, sys, time
+from functools import lru_cache
 
 DEFAULT_IP   = "192.168.86.239"
 DEFAULT_MASK = "255.255.255.0"
 DEFAULT_PORT = 5005
 DEFAULT_TOKEN = "change-me"   # <- must match your config.json on the module
 
+# Binary packets (understood by main.py alongside JSON):
+#   magic[4] | token_len u8 | target_len u8 | token | target | body
+# BUZZ body: duration_ms u16 | intensity u8 (0..255) | flags u8 (bit0 = beep)
+# STOP / PING have an empty body.
+MAGIC_BUZZ = b"BUZZ"
+MAGIC_STOP = b"STOP"
+MAGIC_PING = b"PING"
+BUZZ_BODY = struct.Struct("<HBB")
+FLAG_BEEP = 0x01
+
 def make_sock(broadcast=False, timeout=None):
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     if broadcast:
@@ -41,22 +52,108 @@ def send_json(ip, port, payload, wait_reply=False, timeout=1.5, broadcast=False)
         s.close()
         return None
 
+def pack_packet(magic, token=DEFAULT_TOKEN, target=None, body=b""):
+    tok = token.encode()
+    tgt = target.encode() if target else b""
+    return magic + bytes((len(tok), len(tgt))) + tok + tgt + body
+
+@lru_cache(maxsize=64)
+def pack_buzz(ms, intensity, beep=False, target=None, token=DEFAULT_TOKEN):
+    """Compact binary buzz packet (~5x smaller than JSON); cached so repeated commands are not re-encoded."""
+    ms = 0 if ms < 0 else 0xFFFF if ms > 0xFFFF else int(ms)
+    level = int(round(min(1.0, max(0.0, intensity)) * 255))
+    body = BUZZ_BODY.pack(ms, level, FLAG_BEEP if beep else 0)
+    return pack_packet(MAGIC_BUZZ, token, target, body)
+
+@lru_cache(maxsize=16)
+def pack_stop(target=None, token=DEFAULT_TOKEN):
+    return pack_packet(MAGIC_STOP, token, target)
+
+@lru_cache(maxsize=16)
+def pack_ping(target=None, token=DEFAULT_TOKEN):
+    return pack_packet(MAGIC_PING, token, target)
+
+class HapticClient:
+    """Send commands over one preopened UDP socket (SO_BROADCAST set) instead of a socket per message."""
+
+    def __init__(self, port=DEFAULT_PORT, token=DEFAULT_TOKEN, binary=True):
+        self.port = port
+        self.token = token
+        self.binary = binary   # False: JSON only, for modules running older firmware
+        self.sock = make_sock(broadcast=True)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, ip, payload, wait_reply=False, timeout=1.5):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.sock.sendto(data, (ip, self.port))
+        if not wait_reply:
+            return None
+        self.sock.settimeout(timeout)
+        try:
+            resp, addr = self.sock.recvfrom(2048)
+            return addr[0], resp.decode(errors="ignore")
+        except socket.timeout:
+            return None
+        finally:
+            self.sock.settimeout(None)
+
+    def _payload(self, cmd, target=None, **fields):
+        payload = {"cmd":cmd, **fields, "token":self.token}
+        if target: payload["target"] = target
+        return payload
+
+    def ping(self, ip, target=None, timeout=2.0):
+        payload = pack_ping(target, self.token) if self.binary else self._payload("ping", target)
+        return self.send(ip, payload, wait_reply=True, timeout=timeout)
+
+    def buzz(self, ip, ms, intensity, beep=False, target=None):
+        if self.binary:
+            self.send(ip, pack_buzz(ms, intensity, beep, target, self.token))
+            return
+        payload = self._payload("buzz", target, duration_ms=ms, intensity=intensity)
+        if beep: payload["beep"] = True
+        self.send(ip, payload)
+
+    def stop(self, ip, target=None):
+        self.send(ip, pack_stop(target, self.token) if self.binary else self._payload("stop", target))
+
+    def broadcast_buzz(self, bcast, ms, intensity, beep=False):
+        self.buzz(bcast, ms, intensity, beep=beep)
+
 def discover(port=DEFAULT_PORT, token=DEFAULT_TOKEN, mask=DEFAULT_MASK, ip=DEFAULT_IP, wait_s=1.5):
     """Broadcast 'ping' and collect all replies for wait_s seconds."""
     bcast = calc_broadcast(ip, mask)
-    s = make_sock(broadcast=True, timeout=wait_s)
+    s = make_sock(broadcast=True)
     msg = json.dumps({"cmd":"ping","token":token}).encode()
     s.sendto(msg, (bcast, port))
-    s.settimeout(0.1)
+    s.setblocking(False)
     found = {}
-    t0 = time.time()
-    while time.time() - t0 < wait_s:
-        try:
-            resp, addr = s.recvfrom(2048)
-            found[addr[0]] = resp.decode(errors="ignore")
-        except socket.timeout:
-            pass
-    s.close()
+    deadline = time.time() + wait_s
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            r, _, _ = select.select([s], [], [], remaining)
+            if not r:
+                break
+            # Drain everything that has arrived before going back to select()
+            while True:
+                try:
+                    resp, addr = s.recvfrom(2048)
+                except BlockingIOError:
+                    break
+                found[addr[0]] = resp.decode(errors="ignore")
+    finally:
+        s.close()
     return bcast, found
 
 def main():
@@ -66,6 +163,7 @@ def main():
     p.add_argument("--port", type=int, default=DEFAULT_PORT)
     p.add_argument("--token", default=DEFAULT_TOKEN)
     p.add_argument("--target", default=None, help='Optional device_id filter on the ESP (e.g., "RHIP")')
+    p.add_argument("--json", action="store_true", help="Send JSON only (modules without binary packet support)")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     s_ping = sub.add_parser("ping", help="Ping one module and print reply")
@@ -86,32 +184,6 @@ def main():
 
     args = p.parse_args()
 
-    if args.cmd == "ping":
-        payload = {"cmd":"ping", "token":args.token}
-        if args.target: payload["target"] = args.target
-        r = send_json(args.ip, args.port, payload, wait_reply=True, timeout=2.0)
-        if r:
-            ip, txt = r
-            print(f"Reply from {ip}: {txt}")
-        else:
-            print("No reply. Check IP/port/token and that the ESP is on your LAN.")
-        return
-
-    if args.cmd == "buzz":
-        payload = {"cmd":"buzz","duration_ms":args.ms,"intensity":args.intensity,"token":args.token}
-        if args.beep: payload["beep"] = True
-        if args.target: payload["target"] = args.target
-        send_json(args.ip, args.port, payload, wait_reply=False)
-        print(f"Sent buzz to {args.ip}:{args.port}  ms={args.ms}  intensity={args.intensity}  beep={args.beep}")
-        return
-
-    if args.cmd == "stop":
-        payload = {"cmd":"stop","token":args.token}
-        if args.target: payload["target"] = args.target
-        send_json(args.ip, args.port, payload, wait_reply=False)
-        print(f"Sent stop to {args.ip}:{args.port}")
-        return
-
     if args.cmd == "broadcast-ping":
         bcast, found = discover(port=args.port, token=args.token, mask=args.mask, ip=args.ip, wait_s=args.wait)
         if not found:
@@ -122,13 +194,31 @@ def main():
             print(f"  {k} -> {v}")
         return
 
-    if args.cmd == "broadcast-buzz":
-        bcast = calc_broadcast(args.ip, args.mask)
-        payload = {"cmd":"buzz","duration_ms":args.ms,"intensity":args.intensity,"token":args.token}
-        if args.beep: payload["beep"] = True
-        send_json(bcast, args.port, payload, wait_reply=False, broadcast=True)
-        print(f"Broadcast buzz to {bcast}:{args.port}  ms={args.ms}  intensity={args.intensity}  beep={args.beep}")
-        return
+    with HapticClient(port=args.port, token=args.token, binary=not args.json) as client:
+        if args.cmd == "ping":
+            r = client.ping(args.ip, target=args.target, timeout=2.0)
+            if r:
+                ip, txt = r
+                print(f"Reply from {ip}: {txt}")
+            else:
+                print("No reply. Check IP/port/token and that the ESP is on your LAN.")
+            return
+
+        if args.cmd == "buzz":
+            client.buzz(args.ip, args.ms, args.intensity, beep=args.beep, target=args.target)
+            print(f"Sent buzz to {args.ip}:{args.port}  ms={args.ms}  intensity={args.intensity}  beep={args.beep}")
+            return
+
+        if args.cmd == "stop":
+            client.stop(args.ip, target=args.target)
+            print(f"Sent stop to {args.ip}:{args.port}")
+            return
+
+        if args.cmd == "broadcast-buzz":
+            bcast = calc_broadcast(args.ip, args.mask)
+            client.broadcast_buzz(bcast, args.ms, args.intensity, beep=args.beep)
+            print(f"Broadcast buzz to {bcast}:{args.port}  ms={args.ms}  intensity={args.intensity}  beep={args.beep}")
+            return
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,5 @@
 # main.py — XIAO-ESP32C3 Wi-Fi haptic (MicroPython v1.26)
-import network, time, socket, ujson, machine
+import network, time, socket, select, ujson, ustruct, machine
 
 # ==== PINS per your schematic ====
 MOTOR_PIN  = 2   # D0 -> GPIO2 (through 330Ω to 2N3904/2N2222 base)
@@ -25,6 +25,16 @@ cfg = load_cfg()
 UDP_PORT  = int(cfg.get("udp_port", 5005))
 DEVICE_ID = cfg.get("device_id", "haptic01")
 TOKEN     = cfg.get("token", "change-me")
+TOKEN_B     = TOKEN.encode()
+DEVICE_ID_B = DEVICE_ID.encode()
+
+# Binary packets from haptic_client.py (JSON stays the fallback for unknown magic):
+#   magic[4] | token_len u8 | target_len u8 | token | target | body
+# BUZZ body: duration_ms u16 | intensity u8 (0..255) | flags u8 (bit0 = beep)
+# STOP / PING have an empty body.
+MAGIC_BUZZ = b"BUZZ"
+MAGIC_STOP = b"STOP"
+MAGIC_PING = b"PING"
 
 # ==== Compat for constants across firmware variants ====
 try:
@@ -100,8 +110,14 @@ netif = sta if sta else start_ap("Haptic-" + DEVICE_ID)
 # ==== UDP server ====
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+try:
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)  # soak command bursts
+except (AttributeError, OSError):
+    pass  # not exposed on every port/firmware
 sock.bind(("0.0.0.0", UDP_PORT))
-sock.settimeout(0.05)
+sock.setblocking(False)
+poller = select.poll()
+poller.register(sock, select.POLLIN)
 print("UDP listening on 0.0.0.0:{} ({})".format(UDP_PORT, mode))
 
 active_until_ms = 0
@@ -116,7 +132,74 @@ def start_vibe(duration_ms: int, intensity: float):
     set_intensity(intensity)
     active_until_ms = time.ticks_add(time.ticks_ms(), max(0, int(duration_ms)))
 
+def token_ok(token: bytes):
+    # fixed-length compare: run time does not depend on where the first mismatch is
+    if len(token) != len(TOKEN_B):
+        return False
+    diff = 0
+    for a, b in zip(token, TOKEN_B):
+        diff |= a ^ b
+    return diff == 0
+
+def parse_binary(payload):
+    tlen = payload[4]; glen = payload[5]
+    i = 6 + tlen
+    return payload[6:i], payload[i:i + glen], payload[i + glen:]
+
+# ---- command actions (shared by binary and JSON packets) ----
+def _do_buzz(ms, inten, beep_on):
+    ms = 0 if ms < 0 else 10000 if ms > 10000 else ms
+    inten = 0 if inten < 0 else 1 if inten > 1 else inten
+    start_vibe(ms, inten)
+    if beep_on: beep(120)
+
+def _do_stop():
+    stop_vibe()
+
+def _do_ping(src):
+    ip = netif.ifconfig()[0] if hasattr(netif,'ifconfig') else "0.0.0.0"
+    resp = ujson.dumps({"id":DEVICE_ID,"ip":ip,"mode":mode,"ok":True})
+    try: sock.sendto(resp.encode(), src)
+    except: pass
+
+# ---- binary packets: body -> action ----
+def _bin_buzz(body, src):
+    ms, level, flags = ustruct.unpack("<HBB", body)
+    _do_buzz(ms, level / 255, flags & 0x01)
+
+def _bin_stop(body, src):
+    _do_stop()
+
+def _bin_ping(body, src):
+    _do_ping(src)
+
+cmd_handlers = {MAGIC_BUZZ: _bin_buzz, MAGIC_STOP: _bin_stop, MAGIC_PING: _bin_ping}
+
+# ---- JSON packets (fallback path) ----
+def _json_buzz(msg, src):
+    _do_buzz(int(msg.get("duration_ms", 1000)), float(msg.get("intensity", 1.0)), msg.get("beep"))
+
+def _json_stop(msg, src):
+    _do_stop()
+
+def _json_ping(msg, src):
+    _do_ping(src)
+
+json_handlers = {"buzz": _json_buzz, "stop": _json_stop, "ping": _json_ping}
+
 def handle_packet(payload: bytes, src):
+    handler = cmd_handlers.get(payload[:4])
+    if handler is not None:
+        try:
+            token, tgt, body = parse_binary(payload)
+            if not token_ok(token):
+                print("bad token from", src); return
+            if tgt and tgt != DEVICE_ID_B:
+                return
+            handler(body, src)
+        except Exception as e:
+            print("bad packet from", src, e)
+        return
     try:
         msg = ujson.loads(payload)
     except Exception as e:
@@ -126,28 +209,23 @@ def handle_packet(payload: bytes, src):
     tgt = msg.get("target")
     if tgt and tgt != DEVICE_ID:
         return
-    cmd = msg.get("cmd","")
-    if cmd == "buzz":
-        ms  = int(msg.get("duration_ms", 1000))
-        inten = float(msg.get("intensity", 1.0))
-        ms = 0 if ms < 0 else 10000 if ms > 10000 else ms
-        inten = 0 if inten < 0 else 1 if inten > 1 else inten
-        start_vibe(ms, inten)
-        if msg.get("beep"): beep(120)
-    elif cmd == "stop":
-        stop_vibe()
-    elif cmd == "ping":
-        ip = netif.ifconfig()[0] if hasattr(netif,'ifconfig') else "0.0.0.0"
-        resp = ujson.dumps({"id":DEVICE_ID,"ip":ip,"mode":mode,"ok":True})
-        try: sock.sendto(resp.encode(), src)
-        except: pass
+    handler = json_handlers.get(msg.get("cmd",""))
+    if handler is not None:
+        handler(msg, src)
 
 # ==== Main loop ====
+# Sleep in poll() until a packet arrives or the running vibration is due to end,
+# instead of waking every 50 ms on a recv timeout.
 while True:
-    try:
-        data, src = sock.recvfrom(512)
-        handle_packet(data, src)
-    except OSError:
-        pass
+    if active_until_ms:
+        wait = max(0, time.ticks_diff(active_until_ms, time.ticks_ms()))
+    else:
+        wait = 1000
+    if poller.poll(wait):
+        try:
+            data, src = sock.recvfrom(512)
+            handle_packet(data, src)
+        except OSError:
+            pass
     if active_until_ms and time.ticks_diff(active_until_ms, time.ticks_ms()) <= 0:
         stop_vibe()
@@ -1,18 +1,82 @@
+import argparse
 import os
 # Disable MediaPipe GPU usage and force software rendering
 os.environ['MEDIAPIPE_DISABLE_GPU'] = '1'
 os.environ['LIBGL_ALWAYS_SOFTWARE'] = '1'
+# Fewer glibc malloc arenas -> less fragmentation with many threads. The variable only reaches
+# child processes (ffmpeg); glibc has already read it for this one, so also set it via mallopt.
+os.environ.setdefault('MALLOC_ARENA_MAX', '2')
+
+import ctypes
+import ctypes.util
+
+
+def _limit_malloc_arenas(n):
+    """glibc mallopt(M_ARENA_MAX, n); a no-op on other C libraries."""
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return
+    try:
+        libc = ctypes.CDLL(libc_name)
+        libc.mallopt(-8, n)   # M_ARENA_MAX
+    except (OSError, AttributeError):
+        pass
+
+
+_limit_malloc_arenas(int(os.environ['MALLOC_ARENA_MAX']))
 
 import sys
 import time
 import csv
+import json
+import queue
+import shutil
+import subprocess
+import threading
 import cv2
 # Disable OpenCL in OpenCV to avoid hardware acceleration
 cv2.ocl.setUseOpenCL(False)
+# Cap OpenCV's per-call thread pool (cvtColor, VideoWriter, ...) so it leaves cores to MediaPipe
+cv2.setNumThreads(2)
 
 from datetime import datetime
+import numpy as np
 import ximu3
 import mediapipe as mp
+from collections import deque
+from mediapipe.framework.formats import landmark_pb2
+from mediapipe.tasks import python as mp_tasks
+from mediapipe.tasks.python import vision as mp_vision
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # optional: pose landmarks fall back to CSV
+    pa = pq = None
+
+# PoseLandmarker model (the "lite" variant matches the old model_complexity=0); not shipped in the
+# repo, download it from POSE_MODEL_URL or point POSE_LANDMARKER_MODEL at a copy
+POSE_MODEL_URL = ('https://storage.googleapis.com/mediapipe-models/pose_landmarker/'
+                  'pose_landmarker_lite/float16/latest/pose_landmarker_lite.task')
+POSE_MODEL_PATH = os.environ.get(
+    'POSE_LANDMARKER_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pose_landmarker_lite.task')
+)
+
+
+# UDP endpoints of the last discovered IMUs, reused to skip the announcement scan on startup
+IMU_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'imu_recorder.json')
+# Result of the h264_nvenc probe for the installed ffmpeg binary, so it doesn't run on every start;
+# delete the file to re-probe after a GPU/driver change
+FFMPEG_CODEC_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'imu_recorder_ffmpeg.json')
+
+# Rows buffered in memory before one csv writerows() call (no per-row flush);
+# the IMU writer thread drains up to IMU_CSV_BATCH queued rows per pass
+IMU_CSV_BATCH = 512
+POSE_CSV_BATCH = 64
+CSV_BUFFERING = 1 << 16
+# Frames per Parquet row group for pose landmarks
+POSE_PARQUET_CHUNK = 1024
 
 
 class IMUConnection:
@@ -27,6 +91,8 @@ class IMUConnection:
         self._prefix = f"{ping.device_name.strip()}_{ping.serial_number.strip()}"
         self.csv_files = {}
         self.csv_writers = {}
+        # ximu3 callbacks only enqueue (name, row); _writer_loop owns the csv writers
+        self._queue = queue.SimpleQueue()
         self.callback_configs = {
             "inertial": {
                 "header": ["device","timestamp","gyro_x [deg/s]","gyro_y [deg/s]","gyro_z [deg/s]","acc_x [g]","acc_y [g]","acc_z [g]"],
@@ -52,52 +118,55 @@ class IMUConnection:
         for name, cfg in self.callback_configs.items():
             fname = f"{self._prefix}_{name}.csv"
             path = os.path.join(session_dir, fname)
-            f = open(path, 'w', newline='')
+            f = open(path, 'w', newline='', buffering=CSV_BUFFERING)
             writer = csv.writer(f)
             writer.writerow(cfg['header'])
             self.csv_files[name] = f
             self.csv_writers[name] = writer
             register = getattr(self._conn, cfg['register_method'])
             register(lambda msg, n=name: self._handle(n, msg))
+        self._writer = threading.Thread(target=self._writer_loop, name=f'{self._prefix}_csv', daemon=True)
+        self._writer.start()
 
     def _handle(self, name, msg):
-        row = self.callback_configs[name]['parser'](msg)
-        if row:
-            self.csv_writers[name].writerow(row)
-            self.csv_files[name].flush()
+        self._queue.put((name, self.callback_configs[name]['parser'](msg)))
+
+    def _writer_loop(self):
+        q = self._queue
+        while True:
+            batch = {name: [] for name in self.csv_writers}
+            item = q.get()
+            stop = item is None
+            n = 0
+            while not stop:
+                batch[item[0]].append(item[1])
+                n += 1
+                if n >= IMU_CSV_BATCH:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                stop = item is None
+            for name, rows in batch.items():
+                if rows:
+                    self.csv_writers[name].writerows(rows)
+            if stop:
+                return
 
     def _parse_inertial(self, msg):
-        parts = msg.to_string().split()
-        if len(parts) < 8:
-            return None
-        ts = parts[0]
-        gx, gy, gz = parts[2:5]
-        ax, ay, az = parts[5:8]
-        return [self._prefix, ts, gx, gy, gz, ax, ay, az]
+        return [self._prefix, msg.timestamp,
+                msg.gyroscope_x, msg.gyroscope_y, msg.gyroscope_z,
+                msg.accelerometer_x, msg.accelerometer_y, msg.accelerometer_z]
 
     def _parse_magnetometer(self, msg):
-        parts = msg.to_string().split()
-        if len(parts) < 6:
-            return None
-        ts = parts[0]
-        mx, my, mz = parts[2:5]
-        return [self._prefix, ts, mx, my, mz]
+        return [self._prefix, msg.timestamp, msg.x, msg.y, msg.z]
 
     def _parse_quaternion(self, msg):
-        parts = msg.to_string().split()
-        if len(parts) < 5:
-            return None
-        ts = parts[0]
-        q0, q1, q2, q3 = parts[-4:]
-        return [self._prefix, ts, q0, q1, q2, q3]
+        return [self._prefix, msg.timestamp, msg.w, msg.x, msg.y, msg.z]
 
     def _parse_euler(self, msg):
-        parts = msg.to_string().split()
-        if len(parts) < 4:
-            return None
-        ts = parts[0]
-        r, p, y = parts[1:4]
-        return [self._prefix, ts, r, p, y]
+        return [self._prefix, msg.timestamp, msg.roll, msg.pitch, msg.yaw]
 
     def send_command(self, key, value=None):
         if value is None:
@@ -115,106 +184,543 @@ class IMUConnection:
 
     def close(self):
         self._conn.close()
+        self._queue.put(None)
+        self._writer.join()
         for f in self.csv_files.values():
             f.close()
 
 
+def connect_imus(session_dir):
+    """
+    Open an IMUConnection per device. Endpoints cached from the previous run are tried first;
+    if there are none or any of them fails to open/ping, rescan with NetworkAnnouncement and
+    rewrite the cache.
+    """
+    try:
+        with open(IMU_CACHE_PATH) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = []
+    if cached:
+        conns = []
+        try:
+            for ip, send_port, receive_port in cached:
+                conns.append(IMUConnection(ximu3.UdpConnectionInfo(ip, send_port, receive_port), session_dir))
+            return conns
+        except Exception as e:
+            print(f"Cached IMU list is stale ({e}); rescanning")
+            for imu in conns:
+                imu.close()
+
+    msgs = ximu3.NetworkAnnouncement().get_messages_after_short_delay()
+    conns = [IMUConnection(m.to_udp_connection_info(), session_dir) for m in msgs]
+    try:
+        os.makedirs(os.path.dirname(IMU_CACHE_PATH), exist_ok=True)
+        with open(IMU_CACHE_PATH, 'w') as f:
+            json.dump([[m.ip_address, m.udp_send, m.udp_receive] for m in msgs], f)
+    except OSError as e:
+        print(f"Could not write {IMU_CACHE_PATH}: {e}")
+    return conns
+
+
+_MISSING = object()   # VisionRecorder: landmarks for a frame have not arrived yet
+_SKIPPED = object()   # VisionRecorder: the LIVE_STREAM landmarker dropped the frame unprocessed
+
+
+def put_drop_oldest(q, item):
+    """Put without blocking the producer: if the queue is full, discard its oldest entry."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class CaptureThread(threading.Thread):
+    """Grabs camera frames for `duration` seconds and pushes (idx, ts, frame) into out_q."""
+
+    def __init__(self, camera, out_q, stop_event, duration):
+        super().__init__(name='capture', daemon=True)
+        self.camera = camera
+        self.out_q = out_q
+        self.stop_event = stop_event
+        self.duration = duration
+
+    def run(self):
+        start = time.time()
+        idx = 0
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                if now - start >= self.duration:
+                    break
+                ret, frame = self.camera.read()
+                if not ret:
+                    break
+                put_drop_oldest(self.out_q, (idx, now, frame))
+                idx += 1
+        finally:
+            put_drop_oldest(self.out_q, None)
+
+
+class InferThread(threading.Thread):
+    """
+    Feeds frames from in_q to a LIVE_STREAM PoseLandmarker via detect_async and forwards
+    (idx, ts, ts_ms, frame) to out_q; landmarks arrive later through the landmarker's callback.
+    """
+
+    def __init__(self, landmarker, in_q, out_q):
+        super().__init__(name='inference', daemon=True)
+        self.landmarker = landmarker
+        self.in_q = in_q
+        self.out_q = out_q
+        # BGR->RGB conversion target, reused every frame (mp.Image copies the pixels it wraps)
+        self._rgb = None
+
+    def run(self):
+        last_ts_ms = -1
+        try:
+            while True:
+                item = self.in_q.get()
+                if item is None:
+                    break
+                idx, ts, frame = item
+                ts_ms = max(int(ts * 1000), last_ts_ms + 1)   # detect_async needs increasing timestamps
+                last_ts_ms = ts_ms
+                if self._rgb is None or self._rgb.shape != frame.shape:
+                    self._rgb = np.empty(frame.shape, dtype=np.uint8)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+                self.landmarker.detect_async(mp.Image(image_format=mp.ImageFormat.SRGB, data=self._rgb), ts_ms)
+                self.out_q.put((idx, ts, ts_ms, frame))
+        finally:
+            self.out_q.put(None)
+
+
+class PreviewThread(threading.Thread):
+    """
+    Owns the HighGUI window: shows the newest frame from in_q (maxsize=1, producer drops stale
+    frames) so imshow/waitKey never run on the writer thread. 'q' sets stop_event.
+    """
+
+    def __init__(self, in_q, stop_event, window='Pose'):
+        super().__init__(name='preview', daemon=True)
+        self.in_q = in_q
+        self.stop_event = stop_event
+        self.window = window
+
+    def run(self):
+        cv2.namedWindow(self.window, cv2.WINDOW_NORMAL)
+        try:
+            while True:
+                try:
+                    frame = self.in_q.get(timeout=0.03)
+                except queue.Empty:
+                    frame = _MISSING          # no new frame: still pump HighGUI events
+                if frame is None:
+                    break
+                if frame is not _MISSING:
+                    cv2.imshow(self.window, frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    self.stop_event.set()     # frames already in flight are still written
+        finally:
+            cv2.destroyWindow(self.window)
+
+
+class CudaVideoWriter:
+    """H.264 via NVENC (cv2.cudacodec); each frame is uploaded into one reused GpuMat."""
+
+    def __init__(self, path, fps, size):
+        self._writer = cv2.cudacodec.createVideoWriter(
+            path, size, cv2.cudacodec.H264, fps, cv2.cudacodec.COLOR_FORMAT_BGR
+        )
+        self._gpu_frame = cv2.cuda_GpuMat()
+
+    def write(self, frame):
+        self._gpu_frame.upload(frame)
+        self._writer.write(self._gpu_frame)
+
+    def release(self):
+        self._writer.release()
+
+
+def cuda_encoder_available():
+    try:
+        return hasattr(cv2, 'cudacodec') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except cv2.error:
+        return False
+
+
+class FfmpegVideoWriter:
+    """
+    H.264 MP4 encoded by an ffmpeg subprocess fed raw BGR frames on stdin, so encoding runs in
+    ffmpeg's own threads (or on NVENC) instead of competing with MediaPipe for the GIL.
+    """
+
+    def __init__(self, path, fps, size, codec='libx264'):
+        w, h = size
+        if codec == 'h264_nvenc':
+            codec_args = ['-c:v', 'h264_nvenc', '-preset', 'p1']
+        else:
+            codec_args = ['-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency']
+        cmd = [
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-video_size', f'{w}x{h}', '-framerate', str(fps),
+            '-i', '-', '-an',
+            *codec_args,
+            '-pix_fmt', 'yuv420p',
+            path
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=10 << 20)
+
+    def write(self, frame):
+        # write() has copied the frame into the pipe by the time it returns, so callers may draw
+        # on it afterwards
+        self._proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+
+    def release(self):
+        try:
+            self._proc.stdin.close()    # EOF: ffmpeg flushes the encoder and finalizes the MP4
+        except BrokenPipeError:
+            pass
+        self._proc.wait()
+
+
+_ffmpeg_codec = None
+
+
+def ffmpeg_h264_codec():
+    """
+    'h264_nvenc' if ffmpeg can actually open it on this machine, else 'libx264'; None without
+    ffmpeg. The answer is cached in FFMPEG_CODEC_CACHE_PATH, keyed by the ffmpeg binary.
+    """
+    global _ffmpeg_codec
+    if _ffmpeg_codec is None:
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            return None
+        key = [os.path.realpath(ffmpeg), os.path.getmtime(ffmpeg)]
+        try:
+            with open(FFMPEG_CODEC_CACHE_PATH) as f:
+                cached = json.load(f)
+            if cached.get('ffmpeg') == key and cached.get('codec') in ('h264_nvenc', 'libx264'):
+                _ffmpeg_codec = cached['codec']
+                return _ffmpeg_codec
+        except (OSError, ValueError, AttributeError):
+            pass
+        # Being listed in `ffmpeg -encoders` doesn't mean there is a usable GPU: encode one test frame
+        probe = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'color=s=256x256',
+                 '-frames:v', '1', '-c:v', 'h264_nvenc', '-f', 'null', '-']
+        try:
+            ok = subprocess.run(probe, capture_output=True, timeout=10).returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            ok = False
+        _ffmpeg_codec = 'h264_nvenc' if ok else 'libx264'
+        try:
+            os.makedirs(os.path.dirname(FFMPEG_CODEC_CACHE_PATH), exist_ok=True)
+            with open(FFMPEG_CODEC_CACHE_PATH, 'w') as f:
+                json.dump({'ffmpeg': key, 'codec': _ffmpeg_codec}, f)
+        except OSError as e:
+            print(f"Could not write {FFMPEG_CODEC_CACHE_PATH}: {e}")
+    return _ffmpeg_codec
+
+
+def open_video_writer(session_dir, name, fps, size):
+    """
+    MP4 through cv2.cudacodec (NVENC) when OpenCV has CUDA, else through an ffmpeg pipe
+    (h264_nvenc or libx264), else the XVID AVI VideoWriter.
+    """
+    path = os.path.join(session_dir, f'{name}.mp4')
+    if cuda_encoder_available():
+        try:
+            return CudaVideoWriter(path, fps, size)
+        except cv2.error as e:
+            print(f"NVENC writer unavailable ({e}); trying ffmpeg")
+    codec = ffmpeg_h264_codec()
+    if codec is not None:
+        try:
+            return FfmpegVideoWriter(path, fps, size, codec)
+        except OSError as e:
+            print(f"ffmpeg writer unavailable ({e}); falling back to XVID")
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    return cv2.VideoWriter(os.path.join(session_dir, f'{name}.avi'), fourcc, fps, size)
+
+
+def landmark_columns(num_landmarks):
+    """
+    Wide header: frame (index in the recorded videos), capture_frame (index as grabbed from the
+    camera; gaps are frames dropped before encoding), timestamp, pose_skipped (1 if the landmarker
+    never processed the frame, as opposed to finding no pose in it), then x/y/z/visibility for
+    every Pose landmark.
+    """
+    headers = ['frame', 'capture_frame', 'timestamp', 'pose_skipped']
+    for i in range(num_landmarks):
+        headers += [
+            f'landmark{i}_x',
+            f'landmark{i}_y',
+            f'landmark{i}_z',
+            f'landmark{i}_visibility'
+        ]
+    return headers
+
+
+class CsvLandmarkWriter:
+    """pose_landmarks.csv: one text row per frame, written POSE_CSV_BATCH rows at a time."""
+
+    def __init__(self, session_dir, num_landmarks):
+        self._file = open(os.path.join(session_dir, 'pose_landmarks.csv'), 'w', newline='',
+                          buffering=CSV_BUFFERING)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(landmark_columns(num_landmarks))
+        self._rows = []
+        self._none_row = (None,) * (4 * num_landmarks)   # landmark columns of a frame with no pose
+
+    def add(self, frame_idx, capture_idx, ts, skipped, landmarks):
+        row = [frame_idx, capture_idx, ts, int(skipped)]
+        row.extend(landmarks.ravel().tolist() if landmarks is not None else self._none_row)
+        self._rows.append(row)
+        if len(self._rows) >= POSE_CSV_BATCH:
+            self._flush()
+
+    def _flush(self):
+        self._writer.writerows(self._rows)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        self._file.close()
+
+
+class ParquetLandmarkWriter:
+    """
+    pose_landmarks.parquet: same columns as the CSV, pose_skipped as a bool and landmarks as
+    float32 (null when no pose was found or the frame was skipped). Frames are collected in preallocated arrays and written one row group per
+    POSE_PARQUET_CHUNK frames, so no per-value string formatting happens.
+    """
+
+    def __init__(self, session_dir, num_landmarks):
+        columns = landmark_columns(num_landmarks)
+        self._schema = pa.schema(
+            [('frame', pa.int64()), ('capture_frame', pa.int64()), ('timestamp', pa.float64()),
+             ('pose_skipped', pa.bool_())]
+            + [(name, pa.float32()) for name in columns[4:]]
+        )
+        self._writer = pq.ParquetWriter(os.path.join(session_dir, 'pose_landmarks.parquet'), self._schema)
+        self._frames = np.empty(POSE_PARQUET_CHUNK, dtype=np.int64)
+        self._capture_frames = np.empty(POSE_PARQUET_CHUNK, dtype=np.int64)
+        self._ts = np.empty(POSE_PARQUET_CHUNK, dtype=np.float64)
+        self._skipped = np.empty(POSE_PARQUET_CHUNK, dtype=bool)
+        self._landmarks = np.empty((POSE_PARQUET_CHUNK, 4 * num_landmarks), dtype=np.float32)
+        self._missing = np.zeros(POSE_PARQUET_CHUNK, dtype=bool)
+        self._n = 0
+
+    def add(self, frame_idx, capture_idx, ts, skipped, landmarks):
+        i = self._n
+        self._frames[i] = frame_idx
+        self._capture_frames[i] = capture_idx
+        self._ts[i] = ts
+        self._skipped[i] = skipped
+        self._missing[i] = landmarks is None
+        if landmarks is not None:
+            self._landmarks[i] = landmarks.ravel()
+        self._n = i + 1
+        if self._n == POSE_PARQUET_CHUNK:
+            self._flush()
+
+    def _flush(self):
+        n = self._n
+        if n == 0:
+            return
+        missing = self._missing[:n]
+        arrays = [pa.array(self._frames[:n]), pa.array(self._capture_frames[:n]), pa.array(self._ts[:n]),
+                  pa.array(self._skipped[:n])]
+        arrays += [pa.array(col, mask=missing) for col in self._landmarks[:n].T]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._n = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def open_landmark_writer(session_dir, num_landmarks, fmt='csv'):
+    """Parquet landmark writer when fmt == 'parquet' and pyarrow is installed, else CSV."""
+    if fmt == 'parquet':
+        if pq is not None:
+            return ParquetLandmarkWriter(session_dir, num_landmarks)
+        print("pyarrow not installed; writing pose landmarks as CSV")
+    return CsvLandmarkWriter(session_dir, num_landmarks)
+
+
 class VisionRecorder:
-    def __init__(self, session_dir, duration):
+    def __init__(self, session_dir, duration, landmark_format='csv'):
         self.session_dir = session_dir
         self.duration = duration
+        if not os.path.exists(POSE_MODEL_PATH):
+            raise FileNotFoundError(
+                f"PoseLandmarker model not found at {POSE_MODEL_PATH}. Download it from "
+                f"{POSE_MODEL_URL} or set POSE_LANDMARKER_MODEL to its path."
+            )
+
+        # The landmarker is created before the camera and writers so a bad model fails fast,
+        # without leaving video files or ffmpeg processes behind.
+        # LIVE_STREAM mode: detect_async returns immediately and results come back on
+        # MediaPipe's thread through _on_pose, keyed by the frame's timestamp in ms.
+        self._results = {}
+        self._results_lock = threading.Lock()
+        self.max_pending = 8   # backstop: frames held back waiting for landmarks before counting as skipped
+        options = mp_vision.PoseLandmarkerOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=POSE_MODEL_PATH),
+            running_mode=mp_vision.RunningMode.LIVE_STREAM,
+            min_pose_detection_confidence=0.5,
+            min_tracking_confidence=0.5,
+            result_callback=self._on_pose
+        )
+        self.landmarker = mp_vision.PoseLandmarker.create_from_options(options)
+        self._landmarker_open = True
+
         self.camera = cv2.VideoCapture(0)
         w = int(self.camera.get(cv2.CAP_PROP_FRAME_WIDTH))
         h = int(self.camera.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = self.camera.get(cv2.CAP_PROP_FPS) or 30.0
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        self.raw_writer = cv2.VideoWriter(
-            os.path.join(session_dir, 'raw_video.avi'), fourcc, fps, (w, h)
-        )
-        self.ann_writer = cv2.VideoWriter(
-            os.path.join(session_dir, 'annotated_video.avi'), fourcc, fps, (w, h)
-        )
-        csv_path = os.path.join(session_dir, 'pose_landmarks.csv')
-        self.pose_file = open(csv_path, 'w', newline='')
-        self.pose_writer = csv.writer(self.pose_file)
-        # Create a wide header for all Pose landmarks
-        num_landmarks = len(mp.solutions.pose.PoseLandmark)
-        headers = ['frame', 'timestamp']
-        for i in range(num_landmarks):
-            headers += [
-                f'landmark{i}_x',
-                f'landmark{i}_y',
-                f'landmark{i}_z',
-                f'landmark{i}_visibility'
-            ]
-        self.pose_writer.writerow(headers)
-
-        self.pose = mp.solutions.pose.Pose(
-            model_complexity=0,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
+        self.raw_writer = open_video_writer(session_dir, 'raw_video', fps, (w, h))
+        self.ann_writer = open_video_writer(session_dir, 'annotated_video', fps, (w, h))
+        self.pose_writer = open_landmark_writer(
+            session_dir, len(mp.solutions.pose.PoseLandmark), landmark_format
         )
+        self._released = False
+        self._frames_written = 0   # index of the next frame in raw_video/annotated_video
         self.drawer = mp.solutions.drawing_utils
+        self._stop_event = threading.Event()
+        self._preview_q = queue.Queue(maxsize=1)
+
+    def _close_landmarker(self):
+        if self._landmarker_open:
+            self._landmarker_open = False
+            self.landmarker.close()
+
+    def _on_pose(self, result, image, ts_ms):
+        # Flatten to an (N, 4) x/y/z/visibility array here, on MediaPipe's callback thread,
+        # so the writer thread never walks landmark objects attribute by attribute.
+        landmarks = None
+        if result.pose_landmarks:
+            landmarks = np.array(
+                [(lm.x, lm.y, lm.z, lm.visibility) for lm in result.pose_landmarks[0]],
+                dtype=np.float64
+            )
+        with self._results_lock:
+            self._results[ts_ms] = landmarks
+
+    def _take_result(self, ts_ms, force):
+        """
+        Landmarks for ts_ms (None if no pose was found). _SKIPPED if the landmarker dropped the
+        frame: results arrive in timestamp order, so a result for a later frame means this one
+        will never get one. _MISSING while still pending and not forced.
+        """
+        with self._results_lock:
+            if ts_ms in self._results:
+                landmarks = self._results.pop(ts_ms)
+            elif force or any(k > ts_ms for k in self._results):
+                landmarks = _SKIPPED
+            else:
+                return _MISSING
+            for stale in [k for k in self._results if k < ts_ms]:
+                del self._results[stale]
+        return landmarks
+
+    def _write_frame(self, capture_idx, ts, frame, landmarks):
+        # Both writers encode/upload synchronously, so the overlay can be drawn on `frame` itself
+        # once the raw copy has been written.
+        self.raw_writer.write(frame)
+        skipped = landmarks is _SKIPPED
+        if skipped:
+            landmarks = None
+        if landmarks is not None:
+            proto = landmark_pb2.NormalizedLandmarkList()
+            proto.landmark.extend(
+                landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=v)
+                for x, y, z, v in landmarks.tolist()
+            )
+            self.drawer.draw_landmarks(
+                frame,
+                proto,
+                mp.solutions.pose.POSE_CONNECTIONS
+            )
+
+        # Capture drops frames when the pipeline falls behind, so the video frame number is
+        # counted here; the capture index is kept alongside it
+        self.pose_writer.add(self._frames_written, capture_idx, ts, skipped, landmarks)
+        self._frames_written += 1
+
+        self.ann_writer.write(frame)
+        put_drop_oldest(self._preview_q, frame)   # nothing writes to `frame` after this
 
     def record(self):
-        start = time.time()
-        frame_idx = 0
-        num_landmarks = len(mp.solutions.pose.PoseLandmark)
-        cv2.namedWindow('Pose', cv2.WINDOW_NORMAL)
+        # capture -> cap_q -> inference (detect_async) -> enc_q -> this thread (video/landmark
+        # writers) -> preview thread. Frames wait in `pending` until their landmarks arrive, until a
+        # later frame's result shows the landmarker skipped them, or (as a backstop) until more
+        # than max_pending newer frames are queued behind them.
+        stop_event = self._stop_event
+        cap_q = queue.Queue(maxsize=3)
+        enc_q = queue.Queue(maxsize=3)
+        capture = CaptureThread(self.camera, cap_q, stop_event, self.duration)
+        infer = InferThread(self.landmarker, cap_q, enc_q)
+        preview = PreviewThread(self._preview_q, stop_event)
+        pending = deque()
+
+        def flush(force=False):
+            while pending:
+                capture_idx, ts, ts_ms, frame = pending[0]
+                landmarks = self._take_result(ts_ms, force or len(pending) > self.max_pending)
+                if landmarks is _MISSING:
+                    return
+                pending.popleft()
+                self._write_frame(capture_idx, ts, frame, landmarks)
+
+        preview.start()
+        capture.start()
+        infer.start()
         try:
             while True:
-                now = time.time()
-                if now - start >= self.duration:
-                    break
-                ret, frame = self.camera.read()
-                if not ret:
-                    break
-                ts = now
-                self.raw_writer.write(frame)
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                res = self.pose.process(rgb)
-                ann = frame.copy()
-                if res.pose_landmarks:
-                    self.drawer.draw_landmarks(
-                        ann,
-                        res.pose_landmarks,
-                        mp.solutions.pose.POSE_CONNECTIONS
-                    )
-                    landmarks = res.pose_landmarks.landmark
-                else:
-                    landmarks = None
-
-                # Build one row per frame with all landmark columns
-                row = [frame_idx, ts]
-                if landmarks:
-                    for lm in landmarks:
-                        row += [lm.x, lm.y, lm.z, lm.visibility]
-                else:
-                    row += [None] * (4 * num_landmarks)
-                self.pose_writer.writerow(row)
-
-                self.ann_writer.write(ann)
-                cv2.imshow('Pose', ann)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                item = enc_q.get()
+                if item is None:
                     break
-                frame_idx += 1
+                pending.append(item)
+                flush()
+            self._close_landmarker()     # waits for in-flight detections to call back
+            flush(force=True)
         finally:
-            self.camera.release()
-            self.raw_writer.release()
-            self.ann_writer.release()
-            self.pose_file.close()
-            cv2.destroyAllWindows()
-            self.pose.close()
+            stop_event.set()
+            while infer.is_alive():      # keep draining so the inference thread can't block on put()
+                try:
+                    enc_q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            capture.join(timeout=1.0)
+            put_drop_oldest(self._preview_q, None)
+            preview.join(timeout=1.0)
+            self.release()
+
+    def release(self):
+        """Close the camera, writers and landmarker; record() does this itself when it ends."""
+        if self._released:
+            return
+        self._released = True
+        self.camera.release()
+        self.raw_writer.release()
+        self.ann_writer.release()
+        self.pose_writer.close()
+        self._close_landmarker()
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python imu_camera_recorder.py <duration_seconds>")
-        sys.exit(1)
-    try:
-        duration_sec = float(sys.argv[1])
-    except ValueError:
-        print("Error: duration must be a number.")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Record x-IMU3 streams together with camera video and pose landmarks.")
+    parser.add_argument("duration", type=float, help="Recording length in seconds")
+    parser.add_argument("--landmarks", choices=("csv", "parquet"), default="csv",
+                        help="Pose landmark file format (parquet needs pyarrow; falls back to csv)")
+    args = parser.parse_args()
 
     # Prepare session directory
     base = 'DataLogger'
@@ -223,18 +729,21 @@ if __name__ == '__main__':
     session_dir = os.path.join(base, sess)
     os.makedirs(session_dir, exist_ok=True)
 
-    # Initialize IMUs
-    msgs = ximu3.NetworkAnnouncement().get_messages_after_short_delay()
-    imu_conns = [IMUConnection(m.to_udp_connection_info(), session_dir) for m in msgs]
-    for imu in imu_conns:
-        imu.send_command('udpDataMessagesEnabled', True)
-        imu.send_command('inertialMessageRateDivisor', 8)
+    # Camera + pose first: if the model or camera is unusable, fail before any IMU is opened
+    recorder = VisionRecorder(session_dir, args.duration, landmark_format=args.landmarks)
 
-    # Record camera + pose for fixed duration
-    recorder = VisionRecorder(session_dir, duration_sec)
+    imu_conns = []
     try:
+        # Initialize IMUs
+        imu_conns = connect_imus(session_dir)
+        for imu in imu_conns:
+            imu.send_command('udpDataMessagesEnabled', True)
+            imu.send_command('inertialMessageRateDivisor', 8)
+
+        # Record camera + pose for fixed duration
         recorder.record()
     finally:
+        recorder.release()
         for imu in imu_conns:
             imu.close()
         print("Recording completed.")
\ No newline at end of file
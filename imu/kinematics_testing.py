@@ -1,111 +1,138 @@
+import functools
+import math
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.spatial.transform import Rotation as R
 
-# Define segment lengths
+# matplotlib is only needed for the demo plot, scipy only for the IMU functions and numba only
+# once the planar kinematics are called; all are imported on first use so importing this module
+# stays cheap.
+_Rotation = None
+
+def _rotation_cls():
+    global _Rotation
+    if _Rotation is None:
+        from scipy.spatial.transform import Rotation
+        _Rotation = Rotation
+    return _Rotation
+
+def _lazy_njit(func):
+    """Compile func with numba.njit on its first call; plain Python if numba is missing."""
+    compiled = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal compiled
+        if compiled is None:
+            try:
+                from numba import njit
+                compiled = njit(cache=True, fastmath=True)(func)
+            except ImportError:
+                compiled = func
+        return compiled(*args, **kwargs)
+    return wrapper
+
+# Define segment lengths (module constants: numba freezes them into the compiled functions)
 L_trunk = 0.5
 L_upper = 0.3
 L_forearm = 0.25
 L_hand = 0.15
 
-# Define helper
-def direction(theta):
-    return np.array([np.sin(theta), np.cos(theta)])
-
 # === Forward Kinematics === #
+@_lazy_njit
 def forward_kinematics(theta_T, theta_S, theta_E, theta_W):
-    pelvis = np.array([0.0, 0.0])
-    shoulder = pelvis + L_trunk * direction(theta_T)
-    elbow = shoulder + L_upper * direction(theta_T + theta_S)
-    wrist = elbow + L_forearm * direction(theta_T + theta_S + theta_E)
-    hand = wrist + L_hand * direction(theta_T + theta_S + theta_E + theta_W)
-    return pelvis, shoulder, elbow, wrist, hand
+    """Planar joint positions; returns a (5, 2) array: pelvis, shoulder, elbow, wrist, hand."""
+    # Segment i points along the cumulative angle of joints 0..i: one vectorized sin/cos each
+    angles = np.cumsum(np.array([theta_T, theta_S, theta_E, theta_W], dtype=np.float64))
+    lengths = np.array([L_trunk, L_upper, L_forearm, L_hand])
+    pts = np.zeros((5, 2))
+    pts[1:, 0] = np.cumsum(lengths * np.sin(angles))
+    pts[1:, 1] = np.cumsum(lengths * np.cos(angles))
+    return pts
 
 # === Inverse Kinematics (for fixed trunk) === #
+@_lazy_njit
 def inverse_kinematics(hand_target, theta_T):
-    # Compute shoulder position
-    pelvis = np.array([0.0, 0.0])
-    shoulder = pelvis + L_trunk * direction(theta_T)
-    
+    # Compute shoulder position (pelvis at origin)
+    shoulder_x = L_trunk * math.sin(theta_T)
+    shoulder_y = L_trunk * math.cos(theta_T)
+
     # Vector from shoulder to hand
-    vec = hand_target - shoulder
-    dist = np.linalg.norm(vec)
-    
+    vec_x = hand_target[0] - shoulder_x
+    vec_y = hand_target[1] - shoulder_y
+    dist = math.sqrt(vec_x * vec_x + vec_y * vec_y)
+
     # Link lengths
     L1 = L_upper
     L2 = L_forearm + L_hand  # assume straight wrist
-    
+
     # Check reachability
     if dist > (L1 + L2):
         raise ValueError("Target unreachable")
-    
+
     # Law of cosines
     cos_angle_E = (L1**2 + L2**2 - dist**2) / (2 * L1 * L2)
-    theta_E = np.pi - np.arccos(np.clip(cos_angle_E, -1.0, 1.0))  # Elbow angle
-    
+    theta_E = math.pi - math.acos(min(1.0, max(-1.0, cos_angle_E)))  # Elbow angle
+
     # Shoulder angle
-    angle_a = np.arctan2(vec[1], vec[0])
+    angle_a = math.atan2(vec_y, vec_x)
     cos_angle_b = (L1**2 + dist**2 - L2**2) / (2 * L1 * dist)
-    angle_b = np.arccos(np.clip(cos_angle_b, -1.0, 1.0))
+    angle_b = math.acos(min(1.0, max(-1.0, cos_angle_b)))
     theta_S = angle_a - theta_T - angle_b
 
     # Wrist angle (assume straight for now)
     theta_W = -theta_S - theta_E
-    
+
     return theta_S, theta_E, theta_W
 
+def quaternion_rotations(q):
+    """scipy Rotation from quaternion(s) [w, x, y, z]; q is shape (4,) or (N, 4) for a whole recording."""
+    q = np.asarray(q, dtype=float)
+    return _rotation_cls().from_quat(q[..., [1, 2, 3, 0]])  # wxyz -> scipy's xyzw
+
+
 def quaternion_to_matrix(q):
-    """Convert quaternion [w, x, y, z] to 3x3 rotation matrix."""
-    return R.from_quat([q[1], q[2], q[3], q[0]]).as_matrix()
+    """Convert quaternion [w, x, y, z] to 3x3 rotation matrix ((N, 3, 3) for (N, 4) input)."""
+    return quaternion_rotations(q).as_matrix()
+
+
+def homogeneous_transform(rot, offset):
+    """4x4 transform(s) from rotation matrix/matrices (..., 3, 3) and a translation."""
+    T = np.zeros(rot.shape[:-2] + (4, 4))
+    T[..., :3, :3] = rot
+    T[..., :3, 3] = offset
+    T[..., 3, 3] = 1.0
+    return T
 
 
 def forward_kinematics_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, l_trunk, l_upperarm, l_lowerarm):
     """
     Compute hand position in global frame using IMU quaternions for each segment.
-    q_*: quaternion [w, x, y, z] for each segment
+    q_*: quaternion [w, x, y, z] for each segment, or (N, 4) arrays for N timesteps at once
     l_*: length of each segment (scalars)
-    Returns: 3D position of hand in global frame
+    Returns: 3D position of hand in global frame ((N, 3) for batched input)
     """
-    # Rotation matrices
-    R_trunk = quaternion_to_matrix(q_trunk)
-    R_shoulder = quaternion_to_matrix(q_shoulder)
-    R_upperarm = quaternion_to_matrix(q_upperarm)
-    R_lowerarm = quaternion_to_matrix(q_lowerarm)
-
-    # Homogeneous transforms
-    T_trunk = np.eye(4)
-    T_trunk[:3, :3] = R_trunk
-    T_trunk[:3, 3] = [0, 0, 0]  # Assume trunk base at origin
-
-    T_shoulder = np.eye(4)
-    T_shoulder[:3, :3] = R_shoulder
-    T_shoulder[:3, 3] = [0, 0, l_trunk]  # Shoulder offset from trunk
-
-    T_upperarm = np.eye(4)
-    T_upperarm[:3, :3] = R_upperarm
-    T_upperarm[:3, 3] = [0, 0, l_upperarm]  # Elbow offset from shoulder
-
-    T_lowerarm = np.eye(4)
-    T_lowerarm[:3, :3] = R_lowerarm
-    T_lowerarm[:3, 3] = [0, 0, l_lowerarm]  # Wrist offset from elbow
-
-    # Chain the transforms
+    # Homogeneous transforms (one scipy call per segment for all timesteps)
+    T_trunk = homogeneous_transform(quaternion_to_matrix(q_trunk), [0, 0, 0])             # Trunk base at origin
+    T_shoulder = homogeneous_transform(quaternion_to_matrix(q_shoulder), [0, 0, l_trunk])  # Shoulder offset from trunk
+    T_upperarm = homogeneous_transform(quaternion_to_matrix(q_upperarm), [0, 0, l_upperarm])  # Elbow offset from shoulder
+    T_lowerarm = homogeneous_transform(quaternion_to_matrix(q_lowerarm), [0, 0, l_lowerarm])  # Wrist offset from elbow
+
+    # Chain the transforms (matmul broadcasts over the timestep axis)
     T_hand = T_trunk @ T_shoulder @ T_upperarm @ T_lowerarm
-    hand_pos = T_hand[:3, 3]
+    hand_pos = T_hand[..., :3, 3]
     return hand_pos
 
 def compute_joint_angles_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, seq="xyz"):
     """
     Compute joint angles (Euler) from IMU quaternions for trunk, shoulder, upper arm, lower arm.
-    q_*: quaternion [w, x, y, z] for each segment
+    q_*: quaternion [w, x, y, z] for each segment, or (N, 4) arrays for N timesteps at once
     seq: Euler sequence (default 'xyz')
-    Returns: dict of joint angles in radians for each joint
+    Returns: dict of joint angles in radians for each joint ((N, 3) arrays for batched input)
     """
-    # Convert to scipy Rotation objects
-    r_trunk = R.from_quat([q_trunk[1], q_trunk[2], q_trunk[3], q_trunk[0]])
-    r_shoulder = R.from_quat([q_shoulder[1], q_shoulder[2], q_shoulder[3], q_shoulder[0]])
-    r_upperarm = R.from_quat([q_upperarm[1], q_upperarm[2], q_upperarm[3], q_upperarm[0]])
-    r_lowerarm = R.from_quat([q_lowerarm[1], q_lowerarm[2], q_lowerarm[3], q_lowerarm[0]])
+    # Convert to scipy Rotation objects (batched when given (N, 4) arrays)
+    r_trunk = quaternion_rotations(q_trunk)
+    r_shoulder = quaternion_rotations(q_shoulder)
+    r_upperarm = quaternion_rotations(q_upperarm)
+    r_lowerarm = quaternion_rotations(q_lowerarm)
 
     # Relative rotations
     r_shoulder_rel = r_shoulder * r_trunk.inv()
@@ -125,52 +152,53 @@ def compute_joint_angles_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm,
         'wrist': wrist_angles
     }
 
-# === Example usage === #
-theta_T = np.radians(10)  # trunk flexion
-theta_S = np.radians(45)
-theta_E = np.radians(90)
-theta_W = np.radians(30)
-
-# Forward Kinematics
-pts = forward_kinematics(theta_T, theta_S, theta_E, theta_W)
-
-# Plotting
-x = [p[0] for p in pts]
-y = [p[1] for p in pts]
-plt.plot(x, y, '-o', linewidth=3)
-plt.gca().set_aspect('equal')
-plt.grid()
-plt.title("Forward Kinematics - Trunk and Upper Limb")
-plt.xlabel("X (m)")
-plt.ylabel("Y (m)")
-plt.show()
-
-# Inverse Kinematics
-hand_target = pts[-1]  # target is known hand position
-theta_S_ik, theta_E_ik, theta_W_ik = inverse_kinematics(hand_target, theta_T)
-print("IK solution (degrees): Shoulder =", np.degrees(theta_S_ik),
-      "Elbow =", np.degrees(theta_E_ik), "Wrist =", np.degrees(theta_W_ik))
-
-# Example usage for IMU-based FK:
-# q_trunk = [1, 0, 0, 0]  # Identity quaternion
-# q_shoulder = [1, 0, 0, 0]
-# q_upperarm = [1, 0, 0, 0]
-# q_lowerarm = [1, 0, 0, 0]
-# l_trunk = 0.5
-# l_upperarm = 0.3
-# l_lowerarm = 0.25
-# hand_pos = forward_kinematics_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, l_trunk, l_upperarm, l_lowerarm)
-# print("Hand position from IMUs:", hand_pos)
-
-# Example usage for computing joint angles from IMUs:
-# q_trunk = [1, 0, 0, 0]
-# q_shoulder = [1, 0, 0, 0]
-# q_upperarm = [1, 0, 0, 0]
-# q_lowerarm = [1, 0, 0, 0]
-# angles = compute_joint_angles_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, seq="xyz")
-# print("Joint angles (radians):", angles)
-
 if __name__ == "__main__":
+    # === Example usage === #
+    theta_T = np.radians(10)  # trunk flexion
+    theta_S = np.radians(45)
+    theta_E = np.radians(90)
+    theta_W = np.radians(30)
+
+    # Forward Kinematics
+    pts = forward_kinematics(theta_T, theta_S, theta_E, theta_W)
+
+    # Plotting
+    import matplotlib.pyplot as plt
+    x = [p[0] for p in pts]
+    y = [p[1] for p in pts]
+    plt.plot(x, y, '-o', linewidth=3)
+    plt.gca().set_aspect('equal')
+    plt.grid()
+    plt.title("Forward Kinematics - Trunk and Upper Limb")
+    plt.xlabel("X (m)")
+    plt.ylabel("Y (m)")
+    plt.show()
+
+    # Inverse Kinematics
+    hand_target = pts[-1]  # target is known hand position
+    theta_S_ik, theta_E_ik, theta_W_ik = inverse_kinematics(hand_target, theta_T)
+    print("IK solution (degrees): Shoulder =", np.degrees(theta_S_ik),
+          "Elbow =", np.degrees(theta_E_ik), "Wrist =", np.degrees(theta_W_ik))
+
+    # Example usage for IMU-based FK:
+    # q_trunk = [1, 0, 0, 0]  # Identity quaternion
+    # q_shoulder = [1, 0, 0, 0]
+    # q_upperarm = [1, 0, 0, 0]
+    # q_lowerarm = [1, 0, 0, 0]
+    # l_trunk = 0.5
+    # l_upperarm = 0.3
+    # l_lowerarm = 0.25
+    # hand_pos = forward_kinematics_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, l_trunk, l_upperarm, l_lowerarm)
+    # print("Hand position from IMUs:", hand_pos)
+
+    # Example usage for computing joint angles from IMUs:
+    # q_trunk = [1, 0, 0, 0]
+    # q_shoulder = [1, 0, 0, 0]
+    # q_upperarm = [1, 0, 0, 0]
+    # q_lowerarm = [1, 0, 0, 0]
+    # angles = compute_joint_angles_from_imus(q_trunk, q_shoulder, q_upperarm, q_lowerarm, seq="xyz")
+    # print("Joint angles (radians):", angles)
+
     # Example quaternions (identity, no rotation)
     q_trunk = [1, 0, 0, 0]
     q_shoulder = [1, 0, 0, 0]